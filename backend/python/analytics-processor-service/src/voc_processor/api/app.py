@@ -1,9 +1,20 @@
-import asyncio
 from fastapi import FastAPI, Query
 from typing import Optional
 from ..repo.clickhouse_repo import ClickHouseRepo
 from ..config import settings
 
+# reads the daily aggregate states (O(days x event types)) instead of scanning voc_events
+_SUMMARY_SQL = """
+SELECT event_type, countMerge(cnt) AS cnt, avgMerge(avg_sent) as avg_sent
+FROM voc_events_agg_daily
+WHERE d >= today() - %(d)s
+{tenant_filter}
+GROUP BY event_type
+"""
+SUMMARY_SQL = _SUMMARY_SQL.format(tenant_filter="")
+SUMMARY_BY_TENANT_SQL = _SUMMARY_SQL.format(tenant_filter="AND tenant_id = %(t)s")
+
+
 def create_app():
     app = FastAPI(title="voc-processor")
     repo = ClickHouseRepo(settings)
@@ -19,18 +30,10 @@ def create_app():
 
     @app.get("/metrics/summary")
     async def summary(tenant_id: Optional[str] = Query(None), days: int = 7):
-        tenant_filter = ""
-        if tenant_id:
-            tenant_filter = f"AND tenant_id = '{tenant_id}'"
-        sql = f"""
-        SELECT event_type, count() AS cnt, avg(sentiment) as avg_sent
-        FROM voc_events
-        WHERE ts >= now() - INTERVAL {days} DAY
-        {tenant_filter}
-        GROUP BY event_type
-        """
-        loop = asyncio.get_event_loop()
-        rows = await loop.run_in_executor(None, repo.client.query, sql)
+        # bound parameters, never interpolated: tenant_id comes straight from the query string
+        sql = SUMMARY_BY_TENANT_SQL if tenant_id else SUMMARY_SQL
+        parameters = {"d": days, "t": tenant_id}
+        rows = await repo.async_client.query(sql, parameters=parameters)
         return {"rows": rows.result_rows}
 
     return app
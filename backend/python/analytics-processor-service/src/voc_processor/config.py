@@ -1,11 +1,14 @@
 from pydantic import BaseSettings, Field
-from typing import List
+from typing import List, Optional
 
 class Settings(BaseSettings):
     # Kafka
     kafka_bootstrap: str = Field("localhost:9092", env="KAFKA_BOOTSTRAP")
     kafka_topics: List[str] = Field(["voc-events"], env="KAFKA_TOPICS")
     kafka_group_id: str = Field("voc-processor-group", env="KAFKA_GROUP_ID")
+    kafka_dlq_topic: str = Field("voc-events.dlq", env="KAFKA_DLQ_TOPIC")
+    # send attempts per malformed event before it is dropped (counted and logged) and its offset committed
+    kafka_dlq_max_attempts: int = Field(3, env="KAFKA_DLQ_MAX_ATTEMPTS")
 
     # ClickHouse
     clickhouse_host: str = Field("localhost", env="CLICKHOUSE_HOST")
@@ -13,6 +16,23 @@ class Settings(BaseSettings):
     clickhouse_user: str = Field("default", env="CLICKHOUSE_USER")
     clickhouse_password: str = Field("", env="CLICKHOUSE_PASSWORD")
     clickhouse_db: str = Field("default", env="CLICKHOUSE_DB")
+    # HTTP body compression: lz4, zstd, or empty to disable
+    clickhouse_compress: str = Field("lz4", env="CLICKHOUSE_COMPRESS")
+    clickhouse_pool_size: int = Field(32, env="CLICKHOUSE_POOL_SIZE")
+    clickhouse_connect_timeout: int = Field(5, env="CLICKHOUSE_CONNECT_TIMEOUT")
+    clickhouse_send_receive_timeout: int = Field(30, env="CLICKHOUSE_SEND_RECEIVE_TIMEOUT")
+    # server-side batching of inserts; the insert still waits for the flush so offsets never run ahead of the data
+    clickhouse_async_insert: bool = Field(False, env="CLICKHOUSE_ASYNC_INSERT")
+
+    # Batching
+    batch_size: int = Field(10_000, env="BATCH_SIZE")
+    batch_flush_seconds: float = Field(1.0, env="BATCH_FLUSH_SECONDS")
+    batch_max_bytes: int = Field(16 * 1024 * 1024, env="BATCH_MAX_BYTES")
+
+    # NLP
+    nlp_cache_size: int = Field(100_000, env="NLP_CACHE_SIZE")
+    # processes used for sentiment scoring; None means one per CPU, 1 scores inline without a pool
+    nlp_workers: Optional[int] = Field(None, env="NLP_WORKERS")
 
     # HTTP
     http_port: int = Field(8000, env="HTTP_PORT")
@@ -1,4 +1,4 @@
-from aiokafka import AIOKafkaConsumer
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
 
 def make_consumer(bootstrap, group_id, topics):
     return AIOKafkaConsumer(
@@ -8,3 +8,10 @@ def make_consumer(bootstrap, group_id, topics):
         enable_auto_commit=False,
         auto_offset_reset="earliest",
     )
+
+
+def make_producer(bootstrap):
+    return AIOKafkaProducer(
+        bootstrap_servers=bootstrap,
+        linger_ms=50,
+    )
@@ -25,7 +25,7 @@ async def run():
     stop_event = asyncio.Event()
 
     try:
-        loop = asyncio.get_event_loop()
+        loop = asyncio.get_running_loop()
         try:
             loop.add_signal_handler(signal.SIGTERM, stop_event.set)
             loop.add_signal_handler(signal.SIGINT, stop_event.set)
@@ -33,15 +33,22 @@ async def run():
             # Windows fallback: rely on KeyboardInterrupt
             pass
 
-        await stop_event.wait()
+        # a failed pipeline stage ends the process too, so the pod is restarted instead of sitting idle
+        waiters = [asyncio.create_task(stop_event.wait()), asyncio.create_task(worker.failed.wait())]
+        await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        for waiter in waiters:
+            waiter.cancel()
     except KeyboardInterrupt:
         pass
 
-    await worker.stop()
-    await repo.client.close()
-    # shutdown uvicorn server
-    server.should_exit = True
-    await server_task
+    try:
+        # re-raises the stage failure, if any: asyncio.run propagates it and the process exits non-zero
+        await worker.stop()
+    finally:
+        await repo.close()
+        # shutdown uvicorn server
+        server.should_exit = True
+        await server_task
 
 
 if __name__ == "__main__":
@@ -1,43 +1,68 @@
-from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+import msgspec
+from typing import Optional, Dict, Any, Union
 from datetime import datetime
 from uuid import UUID
 
 
-class BaseEvent(BaseModel):
+class _EventFields(msgspec.Struct, kw_only=True):
     event_id: UUID
-    tenant_id: str
+    # pydantic coerced numeric tenant ids to str; accept ints and normalize them below
+    tenant_id: Union[str, int]
     timestamp: datetime
-    event_type: str
     metadata: Optional[Dict[str, Any]] = None
 
+    def __post_init__(self):
+        if not isinstance(self.tenant_id, str):
+            self.tenant_id = str(self.tenant_id)
+
+
+class BaseEvent(_EventFields, kw_only=True):
+    event_type: str
+
 
-class CallEvent(BaseEvent):
-    event_type: str = Field("call", const=True)
+# the typed events carry event_type as their msgspec tag, so it is not a declared field
+class CallEvent(_EventFields, kw_only=True, tag_field="event_type", tag="call"):
     call_id: str
-    agent_id: Optional[str]
-    customer_id: Optional[str]
-    transcript: Optional[str]
-    duration_ms: Optional[int]
-    call_quality: Optional[Dict[str, Any]]
+    agent_id: Optional[str] = None
+    customer_id: Optional[str] = None
+    transcript: Optional[str] = None
+    duration_ms: Optional[int] = None
+    call_quality: Optional[Dict[str, Any]] = None
 
 
-class AgentActionEvent(BaseEvent):
-    event_type: str = Field("agent_action", const=True)
+class AgentActionEvent(_EventFields, kw_only=True, tag_field="event_type", tag="agent_action"):
     action: str
     agent_id: str
-    target_id: Optional[str]
+    target_id: Optional[str] = None
 
 
-class ToolInvocationEvent(BaseEvent):
-    event_type: str = Field("tool_invocation", const=True)
+class ToolInvocationEvent(_EventFields, kw_only=True, tag_field="event_type", tag="tool_invocation"):
     tool_name: str
-    duration_ms: Optional[int]
-    success: Optional[bool]
+    duration_ms: Optional[int] = None
+    success: Optional[bool] = None
 
 
-class QoSMetricEvent(BaseEvent):
-    event_type: str = Field("qos_metric", const=True)
+class QoSMetricEvent(_EventFields, kw_only=True, tag_field="event_type", tag="qos_metric"):
     metric_name: str
     value: float
-    tags: Optional[Dict[str, str]]
+    tags: Optional[Dict[str, str]] = None
+
+
+# built once; strict=False keeps pydantic's lax acceptance (epoch timestamps, numeric strings)
+_TYPED_EVENT_DECODER = msgspec.json.Decoder(
+    Union[CallEvent, AgentActionEvent, ToolInvocationEvent, QoSMetricEvent], strict=False
+)
+_BASE_EVENT_DECODER = msgspec.json.Decoder(BaseEvent, strict=False)
+
+
+def decode_event(raw: bytes) -> Dict[str, Any]:
+    """Decode a Kafka value into an event dict, keeping the typed fields (e.g. transcript) when known."""
+    try:
+        event = _TYPED_EVENT_DECODER.decode(raw)
+    except msgspec.ValidationError:
+        # unknown event_type, or a typed event missing its own fields: accept it as a BaseEvent as before.
+        # malformed JSON raises DecodeError above and is left to the caller.
+        return msgspec.structs.asdict(_BASE_EVENT_DECODER.decode(raw))
+    data = msgspec.structs.asdict(event)
+    data["event_type"] = event.__struct_config__.tag
+    return data
@@ -1,79 +1,150 @@
-import json
-from typing import List, Dict, Any
-from datetime import datetime
-from hashlib import sha256
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import List, Dict, Any, Optional, Tuple
 
+import xxhash
 
-class SimpleCache:
-    def __init__(self):
-        self._cache = {}
+from ..config import settings
+
+
+class LRUCache:
+    def __init__(self, cap: int):
+        self.cap = cap
+        self._cache = OrderedDict()
 
     def get(self, key):
-        return self._cache.get(key)
+        value = self._cache.get(key)
+        if value is not None:
+            self._cache.move_to_end(key)
+        return value
 
     def set(self, key, value):
         self._cache[key] = value
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cap:
+            self._cache.popitem(last=False)
+
+
+cache = LRUCache(settings.nlp_cache_size)
+
+_ANNOTATION_KEYS = ("sentiment", "topic", "processed_at_ns", "payload")
+
+# smallest slice of transcripts worth sending to a scoring process
+_MIN_CHUNK_TEXTS = 64
+
 
+_SENTIMENT_WORDS = {
+    "good": 1, "great": 1, "thank": 1, "satisfied": 1,
+    "bad": -1, "angry": -1, "hate": -1, "not happy": -1, "frustrat": -1,
+}
+_SENTIMENT_RE = re.compile("|".join(re.escape(w) for w in _SENTIMENT_WORDS))
 
-cache = SimpleCache()
+
+def rule_based_sentiment_lc(lc: str) -> float:
+    # expects already lowercased text; each word counts once, however often it occurs
+    return float(sum(_SENTIMENT_WORDS[w] for w in set(_SENTIMENT_RE.findall(lc))))
 
 
 def rule_based_sentiment(text: str) -> float:
-    pos = ["good", "great", "thank", "satisfied"]
-    neg = ["bad", "angry", "hate", "not happy", "frustrat"]
-    lc = text.lower()
-    score = sum(1 for w in pos if w in lc) - sum(1 for w in neg if w in lc)
-    return float(score)
+    return rule_based_sentiment_lc(text.lower())
+
+
+def rule_based_sentiment_batch(lcs: List[str]) -> List[float]:
+    return [rule_based_sentiment_lc(lc) for lc in lcs]
+
+
+def call_model_batch_sync(lcs: List[str]) -> List[float]:
+    # Placeholder synchronous inference (fast heuristic) over lowercased texts. Replace with model call or remote inference.
+    return rule_based_sentiment_batch(lcs)
+
+
+def _cache_key(text: str) -> int:
+    # xxhash>=4 only hashes bytes; surrogatepass keeps lone surrogates from raising
+    return xxhash.xxh3_64_intdigest(text.encode("utf-8", "surrogatepass"))
 
 
-def call_model_batch_sync(texts: List[str]) -> List[float]:
-    # Placeholder synchronous inference (fast heuristic). Replace with model call or remote inference.
+def _score_batch(texts: List[str]) -> List[float]:
+    # pure CPU work, run in a worker process: only the texts cross the pickle boundary
     return [rule_based_sentiment(t) for t in texts]
 
 
-async def annotate_nlp(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    texts = []
-    idxs = []
+async def _score_parallel(
+    texts: List[str], executor: Optional[Executor], workers: int
+) -> Tuple[List[float], Optional[List[str]]]:
+    # returns the rule scores, plus the lowercased texts when scored inline so the model path reuses them
+    # one chunk per worker process, but never chunks so small that pickling outweighs the regex pass
+    n_chunks = min(workers, -(-len(texts) // _MIN_CHUNK_TEXTS))
+    if executor is None or n_chunks <= 1:
+        lcs = [t.lower() for t in texts]
+        return rule_based_sentiment_batch(lcs), lcs
+    size = -(-len(texts) // n_chunks)
+    loop = asyncio.get_running_loop()
+    chunks = await asyncio.gather(*(
+        loop.run_in_executor(executor, _score_batch, texts[i:i + size])
+        for i in range(0, len(texts), size)
+    ))
+    # lowercased copies stay in the worker processes; shipping them back would double the pickling
+    return [score for chunk in chunks for score in chunk], None
+
+
+async def annotate_nlp(
+    events: List[Dict[str, Any]], executor: Optional[Executor] = None, workers: int = 1
+) -> List[Dict[str, Any]]:
+    # one epoch-ns timestamp for the whole batch; converted to a datetime only at insert time
+    now = time.time_ns()
+    misses = []
     for i, e in enumerate(events):
-        text = (e.get("transcript") or "")[:20000]
+        if "payload" not in e:
+            # snapshot of the raw event for storage, taken before annotation
+            e["payload"] = {k: v for k, v in e.items() if k not in _ANNOTATION_KEYS}
+        text = e.get("transcript")
         if not text:
             e["sentiment"] = None
             e["topic"] = None
-            e["processed_at"] = datetime.utcnow()
-            e["payload"] = e.get("payload", e)
+            e["processed_at_ns"] = now
             continue
-        key = sha256(text.encode()).hexdigest()
+        text = text[:20000]
+        # cache hits are resolved here, so only misses are shipped to the scoring processes
+        key = _cache_key(text)
         cached = cache.get(key)
         if cached:
             e["sentiment"] = cached.get("sentiment")
             e["topic"] = cached.get("topic")
-            e["processed_at"] = datetime.utcnow()
-            e["payload"] = e.get("payload", e)
+            e["processed_at_ns"] = now
         else:
+            misses.append((i, key, text))
+
+    # batches without transcripts (qos, tool and agent-action events) or with only cache hits stop here
+    if not misses:
+        return events
+
+    rule_scores, miss_lcs = await _score_parallel([text for _, _, text in misses], executor, workers)
+
+    lcs = []
+    idxs = []
+    for n, ((i, key, text), score) in enumerate(zip(misses, rule_scores)):
+        e = events[i]
+        if abs(score) >= 1.0:
             # quick rule to avoid model calls
-            score = rule_based_sentiment(text)
-            if abs(score) >= 1.0:
-                e["sentiment"] = score
-                e["topic"] = None
-                cache.set(key, {"sentiment": score, "topic": None})
-                e["processed_at"] = datetime.utcnow()
-                e["payload"] = e.get("payload", e)
-            else:
-                texts.append(text)
-                idxs.append((i, key))
-
-    if texts:
+            e["sentiment"] = score
+            e["topic"] = None
+            cache.set(key, {"sentiment": score, "topic": None})
+            e["processed_at_ns"] = now
+        else:
+            # only texts scored in the pool are lowercased a second time
+            lcs.append(miss_lcs[n] if miss_lcs is not None else text.lower())
+            idxs.append((i, key))
+
+    if lcs:
         # synchronous placeholder; for production, implement a batched async model call
-        model_scores = call_model_batch_sync(texts)
+        model_scores = call_model_batch_sync(lcs)
         for (i, key), score in zip(idxs, model_scores):
             events[i]["sentiment"] = score
             events[i]["topic"] = None
-            events[i]["processed_at"] = datetime.utcnow()
-            events[i]["payload"] = events[i].get("payload", events[i])
+            events[i]["processed_at_ns"] = now
             cache.set(key, {"sentiment": score, "topic": None})
 
-    # ensure payload is set for storage
-    for e in events:
-        if "payload" not in e:
-            e["payload"] = e
     return events
@@ -1,21 +1,40 @@
-import asyncio
-import json
 from typing import List, Dict, Any
 from tenacity import retry, wait_exponential, stop_after_attempt
-from datetime import datetime
+import time
+from datetime import datetime, timezone
 
-from clickhouse_connect import get_client
+import orjson
+
+from clickhouse_connect import get_async_client
+from clickhouse_connect.driver.exceptions import DatabaseError
+from clickhouse_connect.driver.httputil import get_pool_manager
 
 
 class ClickHouseRepo:
     def __init__(self, settings):
         self.settings = settings
-        self.client = get_client(
-            host=settings.clickhouse_host,
-            port=settings.clickhouse_port,
-            username=settings.clickhouse_user,
-            password=settings.clickhouse_password,
-            database=settings.clickhouse_db,
+        # awaitable client for inserts and queries, created lazily in ensure_table; clickhouse-connect
+        # still runs each call on the blocking HTTP client via its own ThreadPoolExecutor
+        self.async_client = None
+
+    def _client_kwargs(self):
+        server_settings = {}
+        if self.settings.clickhouse_async_insert:
+            server_settings = {"async_insert": 1, "wait_for_async_insert": 1}
+        return dict(
+            host=self.settings.clickhouse_host,
+            port=self.settings.clickhouse_port,
+            username=self.settings.clickhouse_user,
+            password=self.settings.clickhouse_password,
+            database=self.settings.clickhouse_db,
+            # payload JSON compresses well; lz4 cuts bytes on the wire for near-memcpy CPU cost
+            compress=self.settings.clickhouse_compress or False,
+            # keep-alive pool shared by concurrent inserts and summary queries, reused instead of reconnecting
+            pool_mgr=get_pool_manager(maxsize=self.settings.clickhouse_pool_size, num_pools=8, block=False),
+            connect_timeout=self.settings.clickhouse_connect_timeout,
+            send_receive_timeout=self.settings.clickhouse_send_receive_timeout,
+            query_limit=0,
+            settings=server_settings,
         )
 
     async def ensure_table(self):
@@ -33,25 +52,80 @@ class ClickHouseRepo:
         PARTITION BY (tenant_id, toYYYYMM(ts))
         ORDER BY (tenant_id, ts, event_id)
         """
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, self.client.command, ddl)
+        # daily pre-aggregates for /metrics/summary; no IF NOT EXISTS, so only one replica's CREATE succeeds
+        agg_ddl = """
+        CREATE MATERIALIZED VIEW voc_events_agg_daily
+        ENGINE = AggregatingMergeTree()
+        PARTITION BY toYYYYMM(d)
+        ORDER BY (tenant_id, d, event_type)
+        AS SELECT
+            tenant_id,
+            toDate(ts) AS d,
+            event_type,
+            countState() AS cnt,
+            avgState(sentiment) AS avg_sent
+        FROM voc_events
+        GROUP BY tenant_id, d, event_type
+        """
+        # one-time backfill of the rows stored before the view existed; later inserts reach it through the view
+        backfill_sql = """
+        INSERT INTO voc_events_agg_daily
+        SELECT
+            tenant_id,
+            toDate(ts) AS d,
+            event_type,
+            countState() AS cnt,
+            avgState(sentiment) AS avg_sent
+        FROM voc_events
+        WHERE processed_at < %(cutoff)s
+        GROUP BY tenant_id, d, event_type
+        """
+        if self.async_client is None:
+            self.async_client = await get_async_client(**self._client_kwargs())
+        await self.async_client.command(ddl)
+
+        if await self.async_client.command("EXISTS TABLE voc_events_agg_daily"):
+            return
+        # rows processed before this point are backfilled, rows inserted after CREATE flow through the view;
+        # only a batch in flight on another replica at that instant can land on the wrong side
+        cutoff = await self.async_client.command("SELECT toString(now64(3))")
+        try:
+            await self.async_client.command(agg_ddl)
+        except DatabaseError as exc:
+            if "TABLE_ALREADY_EXISTS" in str(exc):
+                # another replica created the view first and owns the backfill
+                return
+            raise
+        await self.async_client.command(backfill_sql, parameters={"cutoff": cutoff})
 
     @retry(wait=wait_exponential(min=1, max=10), stop=stop_after_attempt(5))
     async def insert_events(self, events: List[Dict[str, Any]]):
         if not events:
             return
-        rows = []
+        # events of one batch share a processed_at, so each distinct value is converted once
+        processed_at_by_ns = {}
+        fallback_ns = time.time_ns()
+        event_ids, tenant_ids, event_types, tss = [], [], [], []
+        sentiments, topics, processed_ats = [], [], []
         for e in events:
-            rows.append((
-                str(e.get("event_id")),
-                e.get("tenant_id"),
-                e.get("event_type"),
-                e.get("ts"),
-                json.dumps(e.get("payload", {})),
-                e.get("sentiment"),
-                e.get("topic"),
-                e.get("processed_at") or datetime.utcnow(),
-            ))
+            # already a UUID from msgspec decoding; the driver packs it as 16 raw bytes
+            event_ids.append(e.get("event_id"))
+            tenant_ids.append(e.get("tenant_id"))
+            event_types.append(e.get("event_type"))
+            tss.append(e.get("timestamp"))
+            sentiments.append(e.get("sentiment"))
+            topics.append(e.get("topic"))
+            ns = e.get("processed_at_ns") or fallback_ns
+            processed_at = processed_at_by_ns.get(ns)
+            if processed_at is None:
+                processed_at = processed_at_by_ns[ns] = datetime.fromtimestamp(ns / 1e9, timezone.utc)
+            processed_ats.append(processed_at)
+        # String columns take bytes as-is, so the serialized payloads are never decoded back to str
+        payloads = [orjson.dumps(e.get("payload", {})) for e in events]
         columns = ["event_id", "tenant_id", "event_type", "ts", "payload", "sentiment", "topic", "processed_at"]
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, self.client.insert, "voc_events", rows, columns)
+        data = [event_ids, tenant_ids, event_types, tss, payloads, sentiments, topics, processed_ats]
+        await self.async_client.insert("voc_events", data, column_names=columns, column_oriented=True)
+
+    async def close(self):
+        if self.async_client is not None:
+            await self.async_client.close()
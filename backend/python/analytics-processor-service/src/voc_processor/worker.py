@@ -1,83 +1,223 @@
 import asyncio
-import json
+import itertools
+import logging
+import multiprocessing
+import os
 import time
+from concurrent.futures import ProcessPoolExecutor
 from typing import List
+import msgspec
+from aiokafka.errors import KafkaError, MessageSizeTooLargeError
 from aiokafka.structs import TopicPartition
 
-from .kafka_client import make_consumer
-from .models.events import BaseEvent
+from .kafka_client import make_consumer, make_producer
+from .models.events import decode_event
 from .nlp.pipeline import annotate_nlp
 from .repo.clickhouse_repo import ClickHouseRepo
 from .config import settings
-from .utils.metrics import M_CONSUMED, M_PROCESSED, M_PROCESS_LATENCY
+from .utils.metrics import M_CONSUMED, M_PROCESSED, M_PROCESS_LATENCY, M_DLQ, M_DLQ_FAILED
 
-BATCH_SIZE = 500
-BATCH_FLUSH_SECONDS = 2.0
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = settings.batch_size
+BATCH_FLUSH_SECONDS = settings.batch_flush_seconds
+# caps the raw message bytes per batch so a flush never builds an oversized insert body
+BATCH_MAX_BYTES = settings.batch_max_bytes
+# batches buffered between pipeline stages (consume -> annotate -> insert)
+PIPELINE_DEPTH = 2
+DLQ_MAX_ATTEMPTS = max(1, settings.kafka_dlq_max_attempts)
+DLQ_RETRY_BACKOFF_SECONDS = 0.5
 
 
 class ConsumerWorker:
     def __init__(self, repo: ClickHouseRepo):
         self.repo = repo
         self._stopping = asyncio.Event()
+        # set when a pipeline stage dies; main waits on it so a dead pipeline exits instead of idling
+        self.failed = asyncio.Event()
         self.consumer = None
+        self.dlq_producer = None
+        self._annotate_queue = asyncio.Queue(maxsize=PIPELINE_DEPTH)
+        self._insert_queue = asyncio.Queue(maxsize=PIPELINE_DEPTH)
+        self._tasks = []
+        self._pool = None
+        self._nlp_workers = 1
+        self._commit_task = None
 
     async def start(self):
+        # os.cpu_count() sees the node, not the pod's CPU limit: set NLP_WORKERS in containers
+        self._nlp_workers = settings.nlp_workers or os.cpu_count() or 1
+        if self._nlp_workers > 1:
+            # spawn, not fork: the parent already runs an event loop and client threads
+            self._pool = ProcessPoolExecutor(
+                max_workers=self._nlp_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        self.dlq_producer = make_producer(settings.kafka_bootstrap)
+        await self.dlq_producer.start()
         self.consumer = make_consumer(settings.kafka_bootstrap, settings.kafka_group_id, settings.kafka_topics)
         await self.consumer.start()
-        self._task = asyncio.create_task(self._run())
+        # batch N is inserted while batch N+1 is annotated; a single insert stage keeps commits in order
+        self._tasks = [
+            asyncio.create_task(self._run()),
+            asyncio.create_task(self._annotate_stage()),
+            asyncio.create_task(self._insert_stage()),
+        ]
+        for task in self._tasks:
+            task.add_done_callback(self._on_task_done)
 
     async def stop(self):
         self._stopping.set()
-        if getattr(self, "_task", None):
-            await self._task
-        if self.consumer:
-            await self.consumer.stop()
+        failure = None
+        try:
+            if self._tasks:
+                results = await asyncio.gather(*self._tasks, return_exceptions=True)
+                failure = next((r for r in results if isinstance(r, Exception)), None)
+        finally:
+            # always release the group membership, flush the DLQ and reap the pool, even after a failed stage
+            if self.consumer:
+                await self.consumer.stop()
+            if self.dlq_producer:
+                # flushes any dead-lettered messages still lingering in the send buffer
+                await self.dlq_producer.stop()
+            if self._pool:
+                self._pool.shutdown()
+        if failure is not None:
+            raise failure
+
+    def _on_task_done(self, task: asyncio.Task):
+        # a failed stage would leave the others blocked on a full or empty queue
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("pipeline stage failed", exc_info=task.exception())
+            self.failed.set()
+            for other in self._tasks:
+                other.cancel()
 
     async def _run(self):
         batch = []
+        # dead-lettered messages with their delivery tasks; their offsets are committed with the batch
+        skipped = []
+        batch_bytes = 0
         last_flush = time.monotonic()
         try:
-            async for msg in self.consumer:
-                try:
-                    data = json.loads(msg.value)
-                    event = BaseEvent.parse_obj(data)
-                except Exception:
-                    # TODO: push to DLQ
-                    continue
-
-                batch.append((msg, event.dict()))
-                M_CONSUMED.inc()
+            while not self._stopping.is_set():
+                # one poll returns a slice per partition; the timeout doubles as the flush timer
+                data = await self.consumer.getmany(
+                    timeout_ms=int(BATCH_FLUSH_SECONDS * 1000),
+                    max_records=BATCH_SIZE - len(batch) - len(skipped),
+                )
+                consumed = 0
+                for records in data.values():
+                    for msg in records:
+                        # one-byte sniff: anything that is not a JSON object skips the decoder entirely
+                        if not msg.value or msg.value.lstrip()[:1] != b"{":
+                            skipped.append((msg, self._dead_letter(msg, b"not a JSON object")))
+                            continue
+                        try:
+                            # parse and validate in a single pass, straight from the raw bytes
+                            event = decode_event(msg.value)
+                        except msgspec.DecodeError as exc:
+                            skipped.append((msg, self._dead_letter(msg, str(exc).encode())))
+                            continue
+
+                        batch.append((msg, event))
+                        batch_bytes += len(msg.value)
+                        consumed += 1
+                M_CONSUMED.inc(consumed)
+
                 now = time.monotonic()
-                if len(batch) >= BATCH_SIZE or (now - last_flush) >= BATCH_FLUSH_SECONDS:
-                    await self._process_batch(batch)
+                if (batch or skipped) and (
+                    len(batch) + len(skipped) >= BATCH_SIZE
+                    or batch_bytes >= BATCH_MAX_BYTES
+                    or (now - last_flush) >= BATCH_FLUSH_SECONDS
+                ):
+                    await self._annotate_queue.put((batch, skipped))
                     batch = []
+                    skipped = []
+                    batch_bytes = 0
                     last_flush = now
 
-                if self._stopping.is_set():
-                    break
-
-            if batch:
-                await self._process_batch(batch)
+            if batch or skipped:
+                await self._annotate_queue.put((batch, skipped))
+            # sentinel: lets the downstream stages drain and exit
+            await self._annotate_queue.put(None)
         finally:
             pass
 
-    async def _process_batch(self, batch: List):
-        start = time.monotonic()
-        msgs, events = zip(*batch)
-        # events are dicts
-        annotated = await annotate_nlp(list(events))
-        await self.repo.insert_events(annotated)
+    def _dead_letter(self, msg, error: bytes) -> asyncio.Task:
+        # delivered in the background so the poll loop never waits on the DLQ; awaited before the batch commits
+        return asyncio.create_task(self._deliver_dead_letter(msg, error))
+
+    async def _deliver_dead_letter(self, msg, error: bytes):
+        # never raises a KafkaError: an event the DLQ cannot take (missing topic, over max_request_size)
+        # is counted and logged, and its offset is committed anyway, so one bad event cannot halt ingestion
+        for attempt in range(1, DLQ_MAX_ATTEMPTS + 1):
+            try:
+                # send() only enqueues into the producer's bounded buffer; the returned future resolves on delivery
+                delivery = await self.dlq_producer.send(
+                    settings.kafka_dlq_topic,
+                    msg.value,
+                    key=msg.key,
+                    headers=[("error", error)],
+                )
+                await delivery
+            except KafkaError as exc:
+                # an oversized event fails the same way on every attempt
+                if attempt == DLQ_MAX_ATTEMPTS or isinstance(exc, MessageSizeTooLargeError):
+                    M_DLQ_FAILED.inc()
+                    logger.error(
+                        "dropping %s[%d]@%d: dead-letter delivery to %s failed after %d attempt(s): %r",
+                        msg.topic, msg.partition, msg.offset, settings.kafka_dlq_topic, attempt, exc,
+                    )
+                    return
+                await asyncio.sleep(DLQ_RETRY_BACKOFF_SECONDS * attempt)
+            else:
+                M_DLQ.inc()
+                return
+
+    async def _annotate_stage(self):
+        while True:
+            item = await self._annotate_queue.get()
+            if item is None:
+                await self._insert_queue.put(None)
+                return
+            batch, skipped = item
+            start = time.monotonic()
+            msgs = [msg for msg, _ in batch]
+            # events are dicts
+            events = [event for _, event in batch]
+            annotated = await annotate_nlp(events, self._pool, self._nlp_workers)
+            await self._insert_queue.put((start, msgs, skipped, annotated))
 
-        # commit offsets: highest offset per partition
-        offsets = {}
-        for msg in msgs:
-            tp = (msg.topic, msg.partition)
-            offsets[tp] = msg.offset
+    async def _insert_stage(self):
+        while True:
+            item = await self._insert_queue.get()
+            if item is None:
+                await self._wait_commit()
+                return
+            await self._process_batch(*item)
+
+    async def _wait_commit(self):
+        if self._commit_task is not None:
+            task, self._commit_task = self._commit_task, None
+            await task
+
+    async def _process_batch(self, start: float, msgs: List, skipped: List, annotated: List):
+        await self.repo.insert_events(annotated)
+        # a dead-lettered offset is committed once its DLQ copy is acknowledged or given up on
+        if skipped:
+            await asyncio.gather(*(delivery for _, delivery in skipped))
 
+        # commit offsets: highest offset per partition, in a single pass
         commit_map = {}
-        for (topic, part), offset in offsets.items():
-            commit_map[TopicPartition(topic, part)] = offset + 1
-        await self.consumer.commit(commit_map)
+        for msg in itertools.chain(msgs, (msg for msg, _ in skipped)):
+            tp = TopicPartition(msg.topic, msg.partition)
+            offset = msg.offset + 1
+            if offset > commit_map.get(tp, -1):
+                commit_map[tp] = offset
+        # at most one commit in flight: it overlaps the next batch's insert, and commits stay ordered
+        await self._wait_commit()
+        self._commit_task = asyncio.create_task(self.consumer.commit(commit_map))
 
         M_PROCESSED.inc(len(annotated))
         M_PROCESS_LATENCY.observe(time.monotonic() - start)
@@ -0,0 +1,50 @@
+import json
+from datetime import datetime, timezone
+
+import msgspec
+import pytest
+
+from voc_processor.models.events import decode_event
+
+EVENT_ID = "3f2b3c1e-2a4d-4a55-9a0e-65d1c9f0b7aa"
+
+
+def _raw(**fields):
+    event = {"event_id": EVENT_ID, "tenant_id": "t1", "timestamp": "2024-01-01T00:00:00Z"}
+    event.update(fields)
+    return json.dumps(event).encode()
+
+
+def test_call_event_keeps_transcript():
+    event = decode_event(_raw(event_type="call", call_id="c1", transcript="thank you"))
+    assert event["event_type"] == "call"
+    assert event["call_id"] == "c1"
+    assert event["transcript"] == "thank you"
+
+
+def test_epoch_timestamp_is_accepted():
+    event = decode_event(_raw(event_type="call", call_id="c1", timestamp=1704067200))
+    assert event["timestamp"] == datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def test_int_tenant_id_is_normalized_to_str():
+    event = decode_event(_raw(event_type="qos_metric", metric_name="mos", value=4.2, tenant_id=42))
+    assert event["tenant_id"] == "42"
+
+
+def test_unknown_event_type_falls_back_to_base_event():
+    event = decode_event(_raw(event_type="custom", extra="ignored"))
+    assert event["event_type"] == "custom"
+    assert "extra" not in event
+
+
+def test_call_without_call_id_falls_back_to_base_event():
+    event = decode_event(_raw(event_type="call", transcript="hello"))
+    assert event["event_type"] == "call"
+    assert "transcript" not in event
+
+
+@pytest.mark.parametrize("raw", [_raw(), b"{not json"])
+def test_missing_event_type_or_bad_json_is_rejected(raw):
+    with pytest.raises(msgspec.DecodeError):
+        decode_event(raw)
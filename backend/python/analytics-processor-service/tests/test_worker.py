@@ -0,0 +1,189 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from aiokafka.errors import KafkaTimeoutError, MessageSizeTooLargeError
+from aiokafka.structs import TopicPartition
+from prometheus_client import REGISTRY
+
+from voc_processor import worker as worker_module
+from voc_processor.worker import ConsumerWorker
+
+TOPIC = "voc-events"
+TP = TopicPartition(TOPIC, 0)
+
+
+def _event(i, **fields):
+    return {
+        "event_id": f"00000000-0000-0000-0000-{i:012d}",
+        "tenant_id": "t1",
+        "timestamp": "2024-01-01T00:00:00Z",
+        **fields,
+    }
+
+
+def _record(offset, value: bytes):
+    return SimpleNamespace(topic=TOPIC, partition=0, offset=offset, key=None, value=value)
+
+
+def _metric(name):
+    return REGISTRY.get_sample_value(name) or 0.0
+
+
+class FakeConsumer:
+    def __init__(self, polls):
+        self._polls = list(polls)
+        self.commits = []
+        self.stopped = False
+
+    async def start(self):
+        pass
+
+    async def getmany(self, timeout_ms, max_records):
+        if self._polls:
+            return {TP: self._polls.pop(0)}
+        await asyncio.sleep(0.01)
+        return {}
+
+    async def commit(self, offsets):
+        self.commits.append(dict(offsets))
+
+    async def stop(self):
+        self.stopped = True
+
+
+class FakeProducer:
+    """send() raises or resolves per the scripted outcomes, then succeeds."""
+
+    def __init__(self, send_errors=(), delivery_errors=()):
+        self._send_errors = list(send_errors)
+        self._delivery_errors = list(delivery_errors)
+        self.sent = []
+        self.stopped = False
+
+    async def start(self):
+        pass
+
+    async def send(self, topic, value, key=None, headers=None):
+        self.sent.append((topic, value))
+        if self._send_errors:
+            raise self._send_errors.pop(0)
+        delivery = asyncio.get_running_loop().create_future()
+        if self._delivery_errors:
+            delivery.set_exception(self._delivery_errors.pop(0))
+        else:
+            delivery.set_result(None)
+        return delivery
+
+    async def stop(self):
+        self.stopped = True
+
+
+class FakeRepo:
+    def __init__(self, error=None):
+        self.rows = []
+        self._error = error
+
+    async def insert_events(self, events):
+        if self._error is not None:
+            raise self._error
+        self.rows.extend(events)
+
+
+@pytest.fixture(autouse=True)
+def _fast_worker(monkeypatch):
+    # flush on every poll, score inline and retry the DLQ without sleeping
+    monkeypatch.setattr(worker_module, "BATCH_FLUSH_SECONDS", 0)
+    monkeypatch.setattr(worker_module, "DLQ_RETRY_BACKOFF_SECONDS", 0)
+    monkeypatch.setattr(worker_module.settings, "nlp_workers", 1)
+
+
+async def _start(monkeypatch, consumer, producer, repo):
+    monkeypatch.setattr(worker_module, "make_consumer", lambda *args: consumer)
+    monkeypatch.setattr(worker_module, "make_producer", lambda *args: producer)
+    worker = ConsumerWorker(repo)
+    await worker.start()
+    return worker
+
+
+async def _until(condition, timeout=5.0):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), timeout)
+
+
+@pytest.mark.asyncio
+async def test_dead_lettered_offsets_are_committed(monkeypatch):
+    consumer = FakeConsumer([[
+        _record(0, json.dumps(_event(0, event_type="call", call_id="c0", transcript="great, thank you")).encode()),
+        # leading whitespace is still a JSON object
+        _record(1, b"  \n" + json.dumps(_event(1, event_type="custom")).encode()),
+        # trailing malformed messages: their offsets must be committed too
+        _record(2, b"not json"),
+        _record(3, b"{broken"),
+    ]])
+    producer = FakeProducer()
+    repo = FakeRepo()
+    delivered = _metric("voc_events_dlq_total")
+
+    worker = await _start(monkeypatch, consumer, producer, repo)
+    await _until(lambda: consumer.commits)
+    await worker.stop()
+
+    assert consumer.commits == [{TP: 4}]
+    assert [row["transcript"] for row in repo.rows if row["event_type"] == "call"] == ["great, thank you"]
+    assert len(repo.rows) == 2
+    assert [value for _, value in producer.sent] == [b"not json", b"{broken"]
+    assert _metric("voc_events_dlq_total") - delivered == 2
+    assert consumer.stopped and producer.stopped
+
+
+@pytest.mark.asyncio
+async def test_oversized_dead_letter_is_dropped_and_committed(monkeypatch):
+    consumer = FakeConsumer([[_record(0, b"\x00" * 16)]])
+    producer = FakeProducer(send_errors=[MessageSizeTooLargeError()])
+    failed = _metric("voc_events_dlq_failed_total")
+
+    worker = await _start(monkeypatch, consumer, producer, FakeRepo())
+    await _until(lambda: consumer.commits)
+    await worker.stop()
+
+    # a deterministic failure is not retried
+    assert len(producer.sent) == 1
+    assert consumer.commits == [{TP: 1}]
+    assert _metric("voc_events_dlq_failed_total") - failed == 1
+    assert not worker.failed.is_set()
+
+
+@pytest.mark.asyncio
+async def test_failed_dead_letter_delivery_is_retried_then_committed(monkeypatch):
+    attempts = worker_module.DLQ_MAX_ATTEMPTS
+    consumer = FakeConsumer([[_record(0, b"[]")], [_record(1, json.dumps(_event(1, event_type="custom")).encode())]])
+    producer = FakeProducer(delivery_errors=[KafkaTimeoutError()] * attempts)
+    failed = _metric("voc_events_dlq_failed_total")
+
+    worker = await _start(monkeypatch, consumer, producer, FakeRepo())
+    await _until(lambda: len(consumer.commits) == 2)
+    await worker.stop()
+
+    # ingestion carries on past the undeliverable message
+    assert len(producer.sent) == attempts
+    assert consumer.commits == [{TP: 1}, {TP: 2}]
+    assert _metric("voc_events_dlq_failed_total") - failed == 1
+    assert not worker.failed.is_set()
+
+
+@pytest.mark.asyncio
+async def test_stage_failure_sets_failed_and_stop_cleans_up(monkeypatch):
+    consumer = FakeConsumer([[_record(0, json.dumps(_event(0, event_type="custom")).encode())]])
+    producer = FakeProducer()
+
+    worker = await _start(monkeypatch, consumer, producer, FakeRepo(error=RuntimeError("clickhouse down")))
+    await asyncio.wait_for(worker.failed.wait(), 5)
+
+    with pytest.raises(RuntimeError, match="clickhouse down"):
+        await worker.stop()
+    assert consumer.commits == []
+    assert consumer.stopped and producer.stopped